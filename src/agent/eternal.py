@@ -9,44 +9,103 @@ import json
 import time
 import logging
 import asyncio
+from collections import deque
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Deque, Dict, Optional
 
 logger = logging.getLogger("eternal-agent")
 
+# Compact JSON bytes for publish_data payloads; orjson is used when installed
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+from livekit import rtc
 from livekit.agents import Agent, RunContext, ChatContext, function_tool, get_job_context
 
 from src.database.supabase import DBError, SupabaseDB
 from src.prompts.greetings import GREETING_INSTRUCTIONS
 from src.prompts.system import SYSTEM_INSTRUCTIONS_TEMPLATE
-from src.prompts.summary_instructions import SUMMARY_INSTRUCTIONS_TEMPLATE
-from src.utils.utils import normalize_phone, iso_to_ist_iso, now_ist_iso, IST_TZ_NAME, IST, parse_iso, get_today_ist_str, get_booking_window_end_ist_str
+from src.prompts.summary_instructions import render_summary_instructions
+from src.utils.utils import NormalizedPhone, normalize_phone, iso_to_ist_iso, iso_to_ist_iso_many, now_ist_iso, utc_now_iso, IST_TZ_NAME, IST, parse_iso, get_today_ist_str, get_booking_window_end_ist_str
 from src.utils.analytics import SessionAnalytics
 
 TODAY_IST_STR = get_today_ist_str()
 BOOKING_WINDOW_END_IST_STR = get_booking_window_end_ist_str(window_days=15, inclusive=True)
 
-SYSTEM_INSTRUCTIONS = (
-    SYSTEM_INSTRUCTIONS_TEMPLATE
-    .replace("{TODAY_IST_STR}", TODAY_IST_STR)
-    .replace("{BOOKING_WINDOW_END_IST_STR}", BOOKING_WINDOW_END_IST_STR)
+# Single substitution pass over the template (only brace fields are the placeholders)
+SYSTEM_INSTRUCTIONS = SYSTEM_INSTRUCTIONS_TEMPLATE.format_map(
+    {
+        "TODAY_IST_STR": TODAY_IST_STR,
+        "BOOKING_WINDOW_END_IST_STR": BOOKING_WINDOW_END_IST_STR,
+    }
 )
 
-def _utc_now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+_CONVO_ROLES = frozenset(("user", "assistant"))
+
+# Lossy data packets are not retransmitted and anything over one MTU is split,
+# so only tool_event payloads below this size are sent unreliably
+_LOSSY_MAX_BYTES = 1024
+
+# Summary streaming to the frontend (topic: call_summary_stream)
+_SUMMARY_DELTA_MIN_CHARS = 64
+_SUMMARY_DELTA_INTERVAL_S = 0.08
 
 class EternalAgent(Agent):
-    def __init__(self, db: SupabaseDB, session_id: str, summary_llm: Any, summary_model: str, analytics: SessionAnalytics) -> None:
+    def __init__(self, db: SupabaseDB, session_id: str, summary_llm: Any, summary_model: str, analytics: SessionAnalytics, summary_min_turns: int = 2) -> None:
         super().__init__(instructions=SYSTEM_INSTRUCTIONS)
         self._db = db
         self._session_id = session_id
         self._summary_llm = summary_llm
         self._summary_model = summary_model
+        self._summary_min_turns = summary_min_turns
         self._analytics = analytics
-        self._contact_number: Optional[str] = None
+        self._contact_number: Optional[NormalizedPhone] = None
         self._contact_name: Optional[str] = None
+        # Rolling transcript for the end-of-call summary (the DB keeps the full history)
+        self._recent_turns: Deque[Dict[str, str]] = deque(maxlen=80)
+        # Session-constant part of every tool_event payload
+        self._tool_event_proto: Dict[str, Any] = {"type": "tool_event", "session_id": session_id, "tz": IST_TZ_NAME}
+        self._room: Optional[rtc.Room] = None
+        # Background DB writes (tool events) for this session; kept referenced until done
+        self._pending_writes: set[asyncio.Task] = set()
+
+    def _on_write_done(self, task: asyncio.Task) -> None:
+        self._pending_writes.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.error("Background DB write failed", exc_info=exc)
+
+    async def drain_pending_writes(self) -> None:
+        """Wait for this session's background tool-event writes (failures are logged)."""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+
+    def _get_room(self) -> rtc.Room:
+        # Constant for the agent's lifetime; resolve the job context once
+        if self._room is None:
+            self._room = get_job_context().room
+        return self._room
+
+    def _on_conversation_item_added(self, ev: Any) -> None:
+        item = getattr(ev, "item", None)
+        role = getattr(item, "role", None)
+        if role not in _CONVO_ROLES:
+            return
+        text = (getattr(item, "text_content", None) or "").strip()
+        if text:
+            self._recent_turns.append({"role": role, "content": text})
 
     async def on_enter(self):
+        self.session.on("conversation_item_added", self._on_conversation_item_added)
+
         # Initial greeting
         self.session.generate_reply(
             instructions=GREETING_INSTRUCTIONS,
@@ -61,84 +120,142 @@ class EternalAgent(Agent):
         ok: bool,
         error_message: Optional[str],
     ) -> None:
-        # 1) Write to DB
-        await asyncio.to_thread(
-            self._db.insert_tool_event,
-            self._session_id,
-            tool,
-            input_json,
-            output_json,
-            ok,
-            error_message,
+        # 1) Write to DB in the background (telemetry, not on the tool's critical path)
+        task = asyncio.create_task(
+            self._db.insert_tool_event(
+                self._session_id,
+                tool,
+                input_json,
+                output_json,
+                ok,
+                error_message,
+            )
         )
+        self._pending_writes.add(task)
+        task.add_done_callback(self._on_write_done)
 
         # 2) Push to frontend via LiveKit data message
         # publish_data signature supports topic/payload :contentReference[oaicite:1]{index=1}
-        room = get_job_context().room
-        payload = {
-            "type": "tool_event",
-            "session_id": self._session_id,
-            "tool": tool,
-            "input": input_json,
-            "output": output_json,
-            "ok": ok,
-            "error_message": error_message,
-            "ts": _utc_now_iso(),
-            "ts_local": now_ist_iso(),
-            "tz": IST_TZ_NAME,
-        }
+        room = self._get_room()
+        payload = self._tool_event_proto.copy()
+        payload.update(
+            tool=tool,
+            input=input_json,
+            output=output_json,
+            ok=ok,
+            error_message=error_message,
+            ts=utc_now_iso(),
+            ts_local=now_ist_iso(),
+        )
+        data = _dumps(payload)
         await room.local_participant.publish_data(
-            json.dumps(payload).encode("utf-8"),
+            data,
             topic="tool_events",
+            # Small telemetry tolerates loss (no head-of-line blocking); slot/appointment lists must arrive
+            reliable=len(data) > _LOSSY_MAX_BYTES,
         )
 
     async def _generate_and_store_summary(self) -> Dict[str, Any]:
         t0 = time.time()
 
-        messages = await asyncio.to_thread(self._db.list_call_messages, self._session_id, 80)
-        appts = await asyncio.to_thread(self._db.list_appointments_by_session, self._session_id, 30)
+        messages = list(self._recent_turns)
+        appts = await self._db.list_appointments_by_session(self._session_id, 30)
 
         # Prepare compact inputs (avoid huge tokens)
-        convo_lines = []
-        for m in messages:
-            role = m.get("role", "")
-            content = (m.get("content") or "").strip()
-            if role in ("user", "assistant") and content:
-                convo_lines.append(f"{role.upper()}: {content}")
-
-        # Appointments; keep only relevant fields
-        appt_items = []
-        for a in appts:
-            appt_items.append(
-                {
-                    "status": a.get("status"),
-                    "start_at": iso_to_ist_iso(a["start_at"]) if a.get("start_at") else None,
-                    "end_at": iso_to_ist_iso(a["end_at"]) if a.get("end_at") else None,
-                    "title": a.get("title"),
-                    "notes": a.get("notes"),
-                    "appointment_id": a.get("id"),
-                }
+        convo_lines = [
+            f"{role.upper()}: {content}"
+            for role, content in ((m.get("role", ""), (m.get("content") or "").strip()) for m in messages)
+            if role in _CONVO_ROLES and content
+        ]
+
+        # Appointments; DB select already projects to the relevant fields
+        starts_ist = iso_to_ist_iso_many(a.get("start_at") for a in appts)
+        ends_ist = iso_to_ist_iso_many(a.get("end_at") for a in appts)
+        appt_items = [
+            {
+                "status": a.get("status"),
+                "start_at": start_ist,
+                "end_at": end_ist,
+                "title": a.get("title"),
+                "notes": a.get("notes"),
+                "appointment_id": a.get("id"),
+            }
+            for a, start_ist, end_ist in zip(appts, starts_ist, ends_ist)
+        ]
+
+        # Nothing substantive to summarize; skip the LLM round-trip
+        if len(convo_lines) < self._summary_min_turns and not appt_items:
+            summary_text = "Call ended without a substantive conversation."
+            preferences = {"timezone": IST_TZ_NAME, "time_preferences": [], "date_preferences": [], "other": []}
+            await self._db.upsert_call_summary(
+                self._session_id,
+                summary_text,
+                [],
+                preferences,
+                None,
+                int((time.time() - t0) * 1000),
             )
+            return {
+                "type": "call_summary",
+                "session_id": self._session_id,
+                "summary_text": summary_text,
+                "booked_appointments": [],
+                "preferences": preferences,
+                "ts": utc_now_iso(),
+                "ts_local": now_ist_iso(),
+                "tz": IST_TZ_NAME,
+            }
 
         # Caller reference for summary
         caller_name = (self._contact_name or "").strip()
         caller_ref = caller_name if caller_name else "the caller"
 
-        prompt = (
-            SUMMARY_INSTRUCTIONS_TEMPLATE.replace("{caller_ref}", caller_ref)
-            + "Conversation:\n"
-            + "\n".join(convo_lines[-80:])
-            + "\n\n"
-            + "Appointments (IST times):\n"
-            + json.dumps(appt_items, ensure_ascii=False)
+        prompt = "".join(
+            [
+                render_summary_instructions(caller_ref),
+                "Conversation:\n",
+                "\n".join(convo_lines),
+                "\n\nAppointments (IST times):\n",
+                json.dumps(appt_items, ensure_ascii=False, separators=(",", ":")),
+            ]
         )
 
         chat_ctx = ChatContext().empty()
         chat_ctx.add_message(role="system", content="You produce strictly valid JSON, no extra text.")
         chat_ctx.add_message(role="user", content=prompt)
 
-        # Stream response; collect delta.content
+        # Stream response; collect delta.content (joined once at the end)
+        # and forward batched deltas to the frontend as they arrive
         parts: list[str] = []
+        append = parts.append
+        room = self._get_room()
+        flushed = 0  # index into parts already published
+        pending_chars = 0
+        last_flush = time.monotonic()
+        # Lossy channel: seq + char offset let the frontend detect a dropped delta
+        delta_seq = 0
+        delta_offset = 0
+
+        async def _publish_delta(text: str) -> None:
+            nonlocal delta_seq, delta_offset
+            payload = {
+                "type": "call_summary_delta",
+                "session_id": self._session_id,
+                "seq": delta_seq,
+                "offset": delta_offset,
+                "text": text,
+            }
+            delta_seq += 1
+            delta_offset += len(text)
+            try:
+                await room.local_participant.publish_data(
+                    _dumps(payload),
+                    topic="call_summary_stream",
+                    reliable=False,
+                )
+            except Exception:
+                logger.exception("Failed to publish call_summary_delta")
+
         async with self._summary_llm.chat(chat_ctx=chat_ctx) as stream:
             async for chunk in stream:
                 delta = getattr(chunk, "delta", None)  # delta is ChoiceDelta | None
@@ -148,7 +265,20 @@ class EternalAgent(Agent):
                 # ChoiceDelta.content contains the streamed text
                 txt = getattr(delta, "content", None)
                 if txt:
-                    parts.append(txt)
+                    append(txt)
+                    pending_chars += len(txt)
+
+                    # Cap data-channel packet rate: flush only with enough text and a minimum gap
+                    # (the tail is flushed after the stream ends)
+                    now = time.monotonic()
+                    if pending_chars >= _SUMMARY_DELTA_MIN_CHARS and now - last_flush >= _SUMMARY_DELTA_INTERVAL_S:
+                        await _publish_delta("".join(parts[flushed:]))
+                        flushed = len(parts)
+                        pending_chars = 0
+                        last_flush = now
+
+        if flushed < len(parts):
+            await _publish_delta("".join(parts[flushed:]))
 
         out = "".join(parts)
 
@@ -165,8 +295,7 @@ class EternalAgent(Agent):
 
         # Save to DB
         gen_ms = int((time.time() - t0) * 1000)
-        await asyncio.to_thread(
-            self._db.upsert_call_summary,
+        await self._db.upsert_call_summary(
             self._session_id,
             summary_json.get("summary_text") or "",
             summary_json.get("booked_appointments") or [],
@@ -181,11 +310,23 @@ class EternalAgent(Agent):
             "summary_text": summary_json.get("summary_text") or "",
             "booked_appointments": summary_json.get("booked_appointments") or [],
             "preferences": summary_json.get("preferences") or {"timezone": IST_TZ_NAME},
-            "ts": _utc_now_iso(),
+            "ts": utc_now_iso(),
             "ts_local": now_ist_iso(),
             "tz": IST_TZ_NAME,
         }
 
+    def _fallback_summary(self) -> Dict[str, Any]:
+        """Summary payload used when generation times out or fails."""
+        return {
+            "type": "call_summary",
+            "session_id": self._session_id,
+            "summary_text": "Summary is not available right now.",
+            "booked_appointments": [],
+            "preferences": {"timezone": IST_TZ_NAME, "time_preferences": [], "date_preferences": [], "other": []},
+            "ts": utc_now_iso(),
+            "ts_local": now_ist_iso(),
+            "tz": IST_TZ_NAME,
+        }
 
     # -------------------------
     # Tools
@@ -212,8 +353,9 @@ class EternalAgent(Agent):
         input_json = {"contact_number": raw_cn, "normalized_contact_number": cn, "name": name}
 
         try:
-            row = await asyncio.to_thread(self._db.upsert_contact, cn, name)
-            await asyncio.to_thread(self._db.set_session_contact, self._session_id, cn)
+            # The stored name is only needed back when the caller did not give one
+            row = await self._db.upsert_contact(cn, name, fetch_row=not name)
+            await self._db.set_session_contact(self._session_id, cn)
 
             self._contact_number = cn
             self._contact_name = row.get("name")
@@ -250,23 +392,23 @@ class EternalAgent(Agent):
             start_iso = start_local.astimezone(timezone.utc).isoformat()
             end_iso = end_local.astimezone(timezone.utc).isoformat()
 
-            slots = await asyncio.to_thread(self._db.list_slots, start_iso, end_iso)
-            booked_ids = set(await asyncio.to_thread(self._db.booked_slot_ids, start_iso, end_iso))
+            slots = await self._db.list_slots_with_availability(start_iso, end_iso)
+
+            # Convert all slot boundaries to IST in one pass each
+            starts_ist = iso_to_ist_iso_many([s["start_at"] for s in slots])
+            ends_ist = iso_to_ist_iso_many([s["end_at"] for s in slots])
 
             out_slots = []
-            for s in slots:
-                sid = str(s["id"])
-                start_utc = s["start_at"]
-                end_utc = s["end_at"]
+            for s, start_ist, end_ist in zip(slots, starts_ist, ends_ist):
                 out_slots.append(
                     {
-                        "slot_id": sid,
-                        "start_at": iso_to_ist_iso(start_utc),
-                        "end_at": iso_to_ist_iso(end_utc),
-                        "start_at_utc": start_utc,
-                        "end_at_utc": end_utc,
+                        "slot_id": str(s["id"]),
+                        "start_at": start_ist,
+                        "end_at": end_ist,
+                        "start_at_utc": s["start_at"],
+                        "end_at_utc": s["end_at"],
                         "timezone": IST_TZ_NAME,
-                        "available": sid not in booked_ids,
+                        "available": not s["is_booked"],
                     }
                 )
 
@@ -299,7 +441,11 @@ class EternalAgent(Agent):
         tool = "book_appointment"
 
         raw_cn = (contact_number or self._contact_number or "").strip()
-        cn = normalize_phone(raw_cn) if raw_cn else ""
+        if self._contact_number and contact_number in (None, self._contact_number):
+            # Already normalized by identify_user
+            cn = self._contact_number
+        else:
+            cn = normalize_phone(raw_cn)
         input_json = {
             "slot_id": slot_id,
             "title": title,
@@ -313,8 +459,7 @@ class EternalAgent(Agent):
             if not raw_cn:
                 raise DBError("Missing contact_number. Call identify_user first.")
 
-            appt = await asyncio.to_thread(
-                self._db.book_appointment,
+            appt = await self._db.book_appointment(
                 cn,
                 slot_id,
                 title,
@@ -360,7 +505,11 @@ class EternalAgent(Agent):
         tool = "retrieve_appointments"
 
         raw_cn = (contact_number or self._contact_number or "").strip()
-        cn = normalize_phone(raw_cn)
+        if self._contact_number and contact_number in (None, self._contact_number):
+            # Already normalized by identify_user
+            cn = self._contact_number
+        else:
+            cn = normalize_phone(raw_cn)
 
         input_json = {
             "contact_number": contact_number,
@@ -374,24 +523,25 @@ class EternalAgent(Agent):
             if not raw_cn:
                 raise DBError("Missing contact_number. Call identify_user first.")
 
-            rows_raw = await asyncio.to_thread(
-                self._db.list_appointments,
+            rows_raw = await self._db.list_appointments(
                 cn,
                 include_cancelled,
                 max(1, min(limit, 20))
             )
 
+            # Convert all appointment boundaries to IST in one pass each
+            starts_ist = iso_to_ist_iso_many([r.get("start_at") for r in rows_raw])
+            ends_ist = iso_to_ist_iso_many([r.get("end_at") for r in rows_raw])
+
             rows = []
-            for r in rows_raw:
-                start_utc = r.get("start_at")
-                end_utc = r.get("end_at")
+            for r, start_ist, end_ist in zip(rows_raw, starts_ist, ends_ist):
                 rows.append(
                     {
                         **r,
-                        "start_at": iso_to_ist_iso(start_utc) if start_utc else start_utc,
-                        "end_at": iso_to_ist_iso(end_utc) if end_utc else end_utc,
-                        "start_at_utc": start_utc,
-                        "end_at_utc": end_utc,
+                        "start_at": start_ist,
+                        "end_at": end_ist,
+                        "start_at_utc": r.get("start_at"),
+                        "end_at_utc": r.get("end_at"),
                         "timezone": IST_TZ_NAME,
                     }
                 )
@@ -415,7 +565,7 @@ class EternalAgent(Agent):
         input_json = {"appointment_id": appointment_id}
 
         try:
-            row = await asyncio.to_thread(self._db.cancel_appointment, appointment_id)
+            row = await self._db.cancel_appointment(appointment_id)
             cancelled_utc = row.get("cancelled_at")
 
             output_json = {
@@ -446,7 +596,7 @@ class EternalAgent(Agent):
         input_json = {"appointment_id": appointment_id, "new_slot_id": new_slot_id}
 
         try:
-            row = await asyncio.to_thread(self._db.modify_appointment, appointment_id, new_slot_id)
+            row = await self._db.modify_appointment(appointment_id, new_slot_id)
             output_json = {
                 "appointment_id": row["id"],
                 "slot_id": row["slot_id"],
@@ -475,56 +625,31 @@ class EternalAgent(Agent):
         tool = "end_conversation"
         input_json = {}
 
+        fallback_store: Optional[asyncio.Task] = None
         try:
             try:
                 summary_payload = await asyncio.wait_for(
                     self._generate_and_store_summary(),
                     timeout=200.0,
                 )
-            except asyncio.TimeoutError:
-                logger.warning("Summary generation timed out")
-                summary_payload = {
-                    "type": "call_summary",
-                    "session_id": self._session_id,
-                    "summary_text": "Summary is not available right now.",
-                    "booked_appointments": [],
-                    "preferences": {"timezone": IST_TZ_NAME, "time_preferences": [], "date_preferences": [], "other": []},
-                    "ts": _utc_now_iso(),
-                    "ts_local": now_ist_iso(),
-                    "tz": IST_TZ_NAME,
-                }
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    logger.warning("Summary generation timed out")
+                else:
+                    logger.exception("Summary generation failed")
+                summary_payload = self._fallback_summary()
 
                 # IMPORTANT: store fallback too, so DB is never empty
-                await asyncio.to_thread(
-                    self._db.upsert_call_summary,
-                    self._session_id,
-                    summary_payload["summary_text"],
-                    summary_payload["booked_appointments"],
-                    summary_payload["preferences"],
-                    self._summary_model,
-                    None,
-                )
-            except Exception:
-                logger.exception("Summary generation failed")
-                # Same fallback + store
-                summary_payload = {
-                    "type": "call_summary",
-                    "session_id": self._session_id,
-                    "summary_text": "Summary is not available right now.",
-                    "booked_appointments": [],
-                    "preferences": {"timezone": IST_TZ_NAME, "time_preferences": [], "date_preferences": [], "other": []},
-                    "ts": _utc_now_iso(),
-                    "ts_local": now_ist_iso(),
-                    "tz": IST_TZ_NAME,
-                }
-                await asyncio.to_thread(
-                    self._db.upsert_call_summary,
-                    self._session_id,
-                    summary_payload["summary_text"],
-                    summary_payload["booked_appointments"],
-                    summary_payload["preferences"],
-                    self._summary_model,
-                    None,
+                # (overlaps with publishing; awaited before shutdown)
+                fallback_store = asyncio.create_task(
+                    self._db.upsert_call_summary(
+                        self._session_id,
+                        summary_payload["summary_text"],
+                        summary_payload["booked_appointments"],
+                        summary_payload["preferences"],
+                        self._summary_model,
+                        None,
+                    )
                 )
 
             try:
@@ -545,24 +670,36 @@ class EternalAgent(Agent):
                 logger.exception("Failed to attach session analytics")
 
             # Publish summary
-            room = get_job_context().room
+            room = self._get_room()
             await room.local_participant.publish_data(
-                json.dumps(summary_payload).encode("utf-8"),
+                _dumps(summary_payload),
                 topic="call_summary",
+                reliable=True,
             )
 
-            # (optional safety) give the data packet a moment before shutdown
-            await asyncio.sleep(0.2)
+            output_json = {"session_id": self._session_id, "ended_at": utc_now_iso()}
 
-            await asyncio.to_thread(self._db.end_call_session, self._session_id)
+            # Independent shutdown steps; run them concurrently
+            # (the short sleep gives the summary packet a moment before shutdown)
+            steps = [asyncio.sleep(0.2), self._db.end_call_session(self._session_id)]
+            if fallback_store is not None:
+                steps.append(fallback_store)
+            for r in await asyncio.gather(*steps, return_exceptions=True):
+                if isinstance(r, BaseException):
+                    raise r
 
-            output_json = {"session_id": self._session_id, "ended_at": _utc_now_iso()}
+            # Report success only once the session-end write has gone through
             await self._emit_tool_event(tool, input_json, output_json, True, None)
 
+            # Flush pending tool-event writes before shutting down
+            await self.drain_pending_writes()
+
             self.session.shutdown(drain=True)
             return output_json
 
         except Exception as e:
+            if fallback_store is not None:
+                await asyncio.gather(fallback_store, return_exceptions=True)
             msg = str(e)
             await self._emit_tool_event(tool, input_json, {"error": msg}, False, msg)
             return {"error": msg}
@@ -9,12 +9,7 @@ import os
 from dataclasses import dataclass
 
 
-def _get_env(name: str, default: str | None = None) -> str | None:
-    v = os.getenv(name)
-    if v is None:
-        return default
-    v = v.strip()
-    return v if v else default
+_TRUTHY = frozenset(("1", "true", "yes", "y"))
 
 
 @dataclass(frozen=True)
@@ -49,39 +44,40 @@ class Settings:
     preemptive_generation: bool = True
     resume_false_interruption: bool = True
     false_interruption_timeout: float = 1.0
+    summary_min_turns: int = 2
 
     @staticmethod
     def from_env() -> "Settings":
+        env = os.environ
+
+        def g(name: str, default: str) -> str:
+            v = env.get(name)
+            if v is None:
+                return default
+            v = v.strip()
+            return v if v else default
+
         return Settings(
-            livekit_url=_get_env("LIVEKIT_URL", "") or "",
-            livekit_api_key=_get_env("LIVEKIT_API_KEY", "") or "",
-            livekit_api_secret=_get_env("LIVEKIT_API_SECRET", "") or "",
-            agent_name=_get_env("AGENT_NAME", "eternal-agent") or "eternal-agent",
-            deepgram_api_key=_get_env("DEEPGRAM_API_KEY", "") or "",
-            openai_api_key=_get_env("OPENAI_API_KEY", "") or "",
-            cartesia_api_key=_get_env("CARTESIA_API_KEY", "") or "",
-            openai_model=_get_env("OPENAI_MODEL", "gpt-4.1-mini") or "gpt-4.1-mini",
-            deepgram_model=_get_env("DEEPGRAM_MODEL", "flux-general-en") or "flux-general-en",
-            cartesia_model=_get_env("CARTESIA_MODEL", "sonic-3") or "sonic-3",
-            cartesia_voice_id=_get_env(
-                "CARTESIA_VOICE_ID",
-                "794f9389-aac1-45b6-b726-9d9369183238",
-            )
-            or "794f9389-aac1-45b6-b726-9d9369183238",
-            bey_api_key=_get_env("BEY_API_KEY","") or "",
-            bey_avatar_id=_get_env("BEY_AVATAR_ID","") or "",
-            supabase_url=_get_env("SUPABASE_URL", "") or "",
-            supabase_service_role_key=_get_env("SUPABASE_SERVICE_ROLE_KEY", "") or "",
-            eager_eot_threshold=float(_get_env("EAGER_EOT_THRESHOLD", "0.4") or "0.4"),
-            preemptive_generation=(_get_env("PREEMPTIVE_GENERATION", "true") or "true").lower()
-            in ("1", "true", "yes", "y"),
-            resume_false_interruption=(
-                _get_env("RESUME_FALSE_INTERRUPTION", "true") or "true"
-            ).lower()
-            in ("1", "true", "yes", "y"),
-            false_interruption_timeout=float(
-                _get_env("FALSE_INTERRUPTION_TIMEOUT", "1.0") or "1.0"
-            ),
+            livekit_url=g("LIVEKIT_URL", ""),
+            livekit_api_key=g("LIVEKIT_API_KEY", ""),
+            livekit_api_secret=g("LIVEKIT_API_SECRET", ""),
+            agent_name=g("AGENT_NAME", "eternal-agent"),
+            deepgram_api_key=g("DEEPGRAM_API_KEY", ""),
+            openai_api_key=g("OPENAI_API_KEY", ""),
+            cartesia_api_key=g("CARTESIA_API_KEY", ""),
+            openai_model=g("OPENAI_MODEL", "gpt-4.1-mini"),
+            deepgram_model=g("DEEPGRAM_MODEL", "flux-general-en"),
+            cartesia_model=g("CARTESIA_MODEL", "sonic-3"),
+            cartesia_voice_id=g("CARTESIA_VOICE_ID", "794f9389-aac1-45b6-b726-9d9369183238"),
+            bey_api_key=g("BEY_API_KEY", ""),
+            bey_avatar_id=g("BEY_AVATAR_ID", ""),
+            supabase_url=g("SUPABASE_URL", ""),
+            supabase_service_role_key=g("SUPABASE_SERVICE_ROLE_KEY", ""),
+            eager_eot_threshold=float(g("EAGER_EOT_THRESHOLD", "0.4")),
+            preemptive_generation=g("PREEMPTIVE_GENERATION", "true").lower() in _TRUTHY,
+            resume_false_interruption=g("RESUME_FALSE_INTERRUPTION", "true").lower() in _TRUTHY,
+            false_interruption_timeout=float(g("FALSE_INTERRUPTION_TIMEOUT", "1.0")),
+            summary_min_turns=int(g("SUMMARY_MIN_TURNS", "2")),
         )
 
     def validate(self) -> None:
@@ -6,9 +6,9 @@ github: https://github.com/yagnikposhiya/eternal-agent
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple, Optional
-from supabase import Client, create_client
-from src.utils.utils import normalize_phone
+from typing import Any, AsyncIterator, Dict, List, Tuple, Optional
+from supabase import AsyncClient
+from src.utils.utils import NormalizedPhone, normalize_phone
 
 class DBError(RuntimeError):
     pass
@@ -20,19 +20,20 @@ def _unwrap(resp: Any) -> Tuple[Any, Any]:
 
 @dataclass
 class SupabaseDB:
-    client: Client
+    client: AsyncClient
 
     @staticmethod
     def from_env(supabase_url: str, service_role_key: str) -> "SupabaseDB":
         if not supabase_url or not service_role_key:
             raise DBError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY")
-        return SupabaseDB(client=create_client(supabase_url, service_role_key))
+        # Async client: queries are awaited on the event loop (no thread hop per call)
+        return SupabaseDB(client=AsyncClient(supabase_url, service_role_key))
 
     # -------------------------
     # Core entities
     # -------------------------
-    def create_call_session(self, room_name: str) -> str:
-        resp = (
+    async def create_call_session(self, room_name: str) -> str:
+        resp = await (
             self.client.table("call_sessions")
             .insert({"room_name": room_name, "status": "active"})
             .execute()
@@ -40,11 +41,11 @@ class SupabaseDB:
         data, err = _unwrap(resp)
         if err:
             raise DBError(str(err))
-        return str(data[0]["id"])
+        return data[0]["id"]
 
-    def set_session_contact(self, session_id: str, contact_number: str) -> None:
-        contact_number = normalize_phone(contact_number)
-        resp = (
+    async def set_session_contact(self, session_id: str, contact_number: NormalizedPhone) -> None:
+        assert contact_number == normalize_phone(contact_number)
+        resp = await (
             self.client.table("call_sessions")
             .update({"contact_number": contact_number})
             .eq("id", session_id)
@@ -54,8 +55,8 @@ class SupabaseDB:
         if err:
             raise DBError(str(err))
 
-    def end_call_session(self, session_id: str) -> None:
-        resp = (
+    async def end_call_session(self, session_id: str) -> None:
+        resp = await (
             self.client.table("call_sessions")
             .update({"status": "ended", "ended_at": "now()"})
             .eq("id", session_id)
@@ -65,27 +66,42 @@ class SupabaseDB:
         if err:
             raise DBError(str(err))
 
-    def upsert_contact(self, contact_number: str, name: Optional[str]) -> Dict[str, Any]:
-        contact_number = normalize_phone(contact_number)
+    async def upsert_contact(
+        self,
+        contact_number: NormalizedPhone,
+        name: Optional[str],
+        fetch_row: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Insert or update a contact. With fetch_row=False the server returns no
+        body (Prefer: return=minimal) and the sent payload is returned instead.
+        """
+        assert contact_number == normalize_phone(contact_number)
         payload: Dict[str, Any] = {"contact_number": contact_number}
         if name:
             payload["name"] = name
 
-        resp = (
+        resp = await (
             self.client.table("contacts")
-            .upsert(payload, on_conflict="contact_number")
+            .upsert(
+                payload,
+                on_conflict="contact_number",
+                returning="representation" if fetch_row else "minimal",
+            )
             .execute()
         )
         data, err = _unwrap(resp)
         if err:
             raise DBError(str(err))
+        if not fetch_row:
+            return payload
         return data[0]
 
     # -------------------------
     # Slots / availability
     # -------------------------
-    def list_slots(self, start_iso: str, end_iso: str, limit: int = 200) -> List[Dict[str, Any]]:
-        resp = (
+    async def list_slots(self, start_iso: str, end_iso: str, limit: int = 200) -> List[Dict[str, Any]]:
+        resp = await (
             self.client.table("slots")
             .select("id,start_at,end_at,is_enabled")
             .eq("is_enabled", True)
@@ -100,8 +116,8 @@ class SupabaseDB:
             raise DBError(str(err))
         return data or []
 
-    def booked_slot_ids(self, start_iso: str, end_iso: str) -> List[str]:
-        resp = (
+    async def booked_slot_ids(self, start_iso: str, end_iso: str) -> List[str]:
+        resp = await (
             self.client.table("appointments")
             .select("slot_id")
             .eq("status", "booked")
@@ -112,20 +128,34 @@ class SupabaseDB:
         data, err = _unwrap(resp)
         if err:
             raise DBError(str(err))
-        return [str(r["slot_id"]) for r in (data or [])]
+        return [r["slot_id"] for r in (data or [])]
+
+    async def list_slots_with_availability(self, start_iso: str, end_iso: str, limit: int = 200) -> List[Dict[str, Any]]:
+        """Enabled slots in [start_iso, end_iso) with an is_booked flag, in one round trip."""
+        resp = await (
+            self.client.rpc(
+                "list_slots_with_availability",
+                {"p_start": start_iso, "p_end": end_iso, "p_limit": limit},
+            )
+            .execute()
+        )
+        data, err = _unwrap(resp)
+        if err:
+            raise DBError(str(err))
+        return data or []
 
     # -------------------------
     # Appointments
     # -------------------------
-    def book_appointment(
+    async def book_appointment(
         self,
-        contact_number: str,
+        contact_number: NormalizedPhone,
         slot_id: str,
         title: Optional[str],
         notes: Optional[str],
         source_session_id: Optional[str],
     ) -> Dict[str, Any]:
-        contact_number = normalize_phone(contact_number)
+        assert contact_number == normalize_phone(contact_number)
         payload: Dict[str, Any] = {
             "contact_number": contact_number,
             "slot_id": slot_id,
@@ -136,7 +166,7 @@ class SupabaseDB:
         if notes:
             payload["notes"] = notes
 
-        resp = (
+        resp = await (
             self.client.table("appointments")
             .insert(payload, returning="representation")
             .execute()
@@ -147,8 +177,8 @@ class SupabaseDB:
             raise DBError(str(err))
         return data[0]
 
-    def list_appointments(self, contact_number: str, include_cancelled: bool, limit: int = 10) -> List[Dict[str, Any]]:
-        contact_number = normalize_phone(contact_number)
+    async def list_appointments(self, contact_number: NormalizedPhone, include_cancelled: bool, limit: int = 10) -> List[Dict[str, Any]]:
+        assert contact_number == normalize_phone(contact_number)
         q = (
             self.client.table("appointments")
             .select("id,slot_id,title,notes,start_at,end_at,status,created_at,cancelled_at")
@@ -159,36 +189,54 @@ class SupabaseDB:
         if not include_cancelled:
             q = q.eq("status", "booked")
 
-        resp = q.execute()
+        resp = await q.execute()
         data, err = _unwrap(resp)
         if err:
             raise DBError(str(err))
         return data or []
 
-    def cancel_appointment(self, appointment_id: str) -> Dict[str, Any]:
-        resp = (
-            self.client.table("appointments")
-            .update({"status": "cancelled", "cancelled_at": "now()"}, returning="representation")
-            .eq("id", appointment_id)
-            .execute()
-        )
+    async def cancel_appointment(self, appointment_id: str, minimal: bool = False) -> Dict[str, Any]:
+        """
+        Cancel an appointment. With minimal=True the row is not sent back
+        (Prefer: return=minimal) and existence is checked from the row count.
+        """
+        q = self.client.table("appointments")
+        patch = {"status": "cancelled", "cancelled_at": "now()"}
+        if minimal:
+            q = q.update(patch, count="exact", returning="minimal").eq("id", appointment_id)
+        else:
+            q = q.update(patch).eq("id", appointment_id).select("id,status,cancelled_at")
+        resp = await q.execute()
         data, err = _unwrap(resp)
         if err:
             raise DBError(str(err))
+        if minimal:
+            if not getattr(resp, "count", None):
+                raise DBError("Appointment not found")
+            return {"id": appointment_id, "status": "cancelled"}
         if not data:
             raise DBError("Appointment not found")
         return data[0]
 
-    def modify_appointment(self, appointment_id: str, new_slot_id: str) -> Dict[str, Any]:
-        resp = (
-            self.client.table("appointments")
-            .update({"slot_id": new_slot_id}, returning="representation")
-            .eq("id", appointment_id)
-            .execute()
-        )
+    async def modify_appointment(self, appointment_id: str, new_slot_id: str, minimal: bool = False) -> Dict[str, Any]:
+        """
+        Move an appointment to another slot. With minimal=True the row is not
+        sent back and existence is checked from the row count.
+        """
+        q = self.client.table("appointments")
+        patch = {"slot_id": new_slot_id}
+        if minimal:
+            q = q.update(patch, count="exact", returning="minimal").eq("id", appointment_id)
+        else:
+            q = q.update(patch).eq("id", appointment_id).select("id,slot_id,start_at,end_at,status")
+        resp = await q.execute()
         data, err = _unwrap(resp)
         if err:
             raise DBError(str(err))
+        if minimal:
+            if not getattr(resp, "count", None):
+                raise DBError("Appointment not found")
+            return {"id": appointment_id, "slot_id": new_slot_id}
         if not data:
             raise DBError("Appointment not found")
         return data[0]
@@ -196,7 +244,7 @@ class SupabaseDB:
     # -------------------------
     # Logging
     # -------------------------
-    def insert_tool_event(
+    async def insert_tool_event(
         self,
         session_id: str,
         tool: str,
@@ -213,7 +261,7 @@ class SupabaseDB:
             "ok": ok,
             "error_message": error_message,
         }
-        resp = self.client.table("tool_events").insert(payload).execute()
+        resp = await self.client.table("tool_events").insert(payload).execute()
         _, err = _unwrap(resp)
         if err:
             raise DBError(str(err))
@@ -221,7 +269,7 @@ class SupabaseDB:
     # -------------------------
     # Call Messages / Summaries
     # -------------------------
-    def insert_call_message(
+    async def insert_call_message(
         self,
         session_id: str,
         role: str,
@@ -234,14 +282,26 @@ class SupabaseDB:
             "content": content,
             "meta": meta or {},
         }
-        resp = self.client.table("call_messages").insert(payload, returning="representation").execute()
+        resp = await self.client.table("call_messages").insert(payload, returning="representation").execute()
         data, err = _unwrap(resp)
         if err:
             raise DBError(str(err))
         return data[0]
 
-    def list_call_messages(self, session_id: str, limit: int = 80) -> List[Dict[str, Any]]:
-        resp = (
+    async def insert_call_messages_bulk(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Insert many call_messages rows (session_id, role, content, meta, created_at) in one request.
+        created_at is set by the caller: a column default would give every row of the batch the same now().
+        """
+        if not rows:
+            return
+        resp = await self.client.table("call_messages").insert(rows).execute()
+        _, err = _unwrap(resp)
+        if err:
+            raise DBError(str(err))
+
+    async def list_call_messages(self, session_id: str, limit: int = 80) -> List[Dict[str, Any]]:
+        resp = await (
             self.client.table("call_messages")
             .select("role,content,meta,created_at")
             .eq("session_id", session_id)
@@ -254,10 +314,41 @@ class SupabaseDB:
             raise DBError(str(err))
         return data or []
 
-    def list_appointments_by_session(self, session_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        resp = (
+    async def iter_call_messages(self, session_id: str, batch: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield a session's messages in conversation order, fetching `batch` rows per request.
+        Order comes from created_at, which the message flusher stamps when a message is
+        queued (rows of one bulk insert are therefore distinct). id only breaks exact ties
+        so the keyset pages stay stable. Not called yet; the end-of-call summary reads the
+        agent's in-memory turns.
+        """
+        batch = max(1, min(batch, 200))
+        cursor: Optional[Tuple[str, str]] = None
+        while True:
+            q = (
+                self.client.table("call_messages")
+                .select("id,role,content,meta,created_at")
+                .eq("session_id", session_id)
+            )
+            if cursor is not None:
+                ts, last_id = cursor
+                q = q.or_(f'created_at.gt."{ts}",and(created_at.eq."{ts}",id.gt.{last_id})')
+            resp = await q.order("created_at").order("id").limit(batch).execute()
+            data, err = _unwrap(resp)
+            if err:
+                raise DBError(str(err))
+            rows = data or []
+            for r in rows:
+                yield r
+            if len(rows) < batch:
+                return
+            last = rows[-1]
+            cursor = (last["created_at"], last["id"])
+
+    async def list_appointments_by_session(self, session_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        resp = await (
             self.client.table("appointments")
-            .select("id,slot_id,title,notes,start_at,end_at,status,created_at,cancelled_at,source_session_id,contact_number")
+            .select("id,title,notes,start_at,end_at,status")
             .eq("source_session_id", session_id)
             .order("start_at", desc=False)
             .limit(max(1, min(limit, 100)))
@@ -268,7 +359,7 @@ class SupabaseDB:
             raise DBError(str(err))
         return data or []
 
-    def upsert_call_summary(
+    async def upsert_call_summary(
         self,
         session_id: str,
         summary_text: str,
@@ -288,7 +379,7 @@ class SupabaseDB:
         if generation_ms is not None:
             payload["generation_ms"] = generation_ms
 
-        resp = (
+        resp = await (
             self.client.table("call_summaries")
             .upsert(payload, on_conflict="session_id", returning="representation")
             .execute()
@@ -7,10 +7,16 @@ from __future__ import annotations
 
 import json
 import os
+import functools
 import asyncio
 import logging
 
+import httpx
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from openai import AsyncClient as OpenAIAsyncClient
 from livekit.plugins import cartesia, deepgram, openai, silero, bey
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 from livekit.agents import AgentServer, AgentSession, JobContext, JobProcess, cli, metrics, ConversationItemAddedEvent, UserInputTranscribedEvent
@@ -19,6 +25,7 @@ from src.agent.eternal import EternalAgent
 from src.config.config import Settings
 from src.database.supabase import SupabaseDB
 from src.utils.analytics import SessionAnalytics
+from src.utils.utils import utc_now_iso
 
 logger = logging.getLogger("eternal-agent")
 logging.basicConfig(level=logging.INFO)
@@ -31,16 +38,65 @@ AGENT_NAME = SETTINGS.agent_name
 
 server = AgentServer()
 
+# Metric attributes logged at DEBUG level
+METRICS_DEBUG_ATTRS = (
+    "duration",
+    "duration_ms",
+    "audio_duration",
+    "audio_duration_ms",
+    "input_tokens",
+    "output_tokens",
+    "characters_count",
+    "character_count",
+    "usage",
+    "type",
+)
+
+# call_messages batching
+MSG_BATCH_SIZE = 20
+MSG_FLUSH_INTERVAL_S = 0.5
+# Roles allowed by call_messages_role_check; anything else would fail the whole batch
+MSG_ROLES = frozenset(("user", "assistant", "system"))
+
 
 def setup_process(proc: JobProcess):
     # Prewarm heavy resources once per worker process
-    proc.userdata["vad"] = silero.VAD.load()
+    # VAD model loads on a background thread, overlapping the setup below
+    vad_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vad-load")
+    proc.userdata["vad"] = vad_loader.submit(silero.VAD.load)
+    vad_loader.shutdown(wait=False)
     proc.userdata["db"] = SupabaseDB.from_env(SETTINGS.supabase_url, SETTINGS.supabase_service_role_key)
+    # One OpenAI HTTP pool, two LLM handles: the session's (its metrics feed usage/cost
+    # analytics) and the summarizer's, whose tokens stay out of the call's analytics.
+    # Pool settings mirror the openai plugin's own default client.
+    oai_client = OpenAIAsyncClient(
+        max_retries=0,
+        http_client=httpx.AsyncClient(
+            timeout=httpx.Timeout(connect=15.0, read=5.0, write=5.0, pool=5.0),
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=50, keepalive_expiry=120),
+        ),
+    )
+    proc.userdata["llm"] = openai.LLM(model=SETTINGS.openai_model, client=oai_client)
+    proc.userdata["summary_llm"] = openai.LLM(model=SETTINGS.openai_model, client=oai_client)
+    # bey.AvatarSession takes no shared HTTP client; cache its per-room factory config
+    proc.userdata["avatar_factory"] = functools.partial(
+        bey.AvatarSession,
+        api_key=SETTINGS.bey_api_key,
+        avatar_id=SETTINGS.bey_avatar_id,
+        avatar_participant_identity="Eternal (SuperBryn)",
+        avatar_participant_name="Eternal (SuperBryn)",
+    )
 
 
 server.setup_fnc = setup_process
 
 
+async def get_vad(proc: JobProcess) -> silero.VAD:
+    """VAD loaded by setup_process; waits without blocking the loop if still loading."""
+    return await asyncio.wrap_future(proc.userdata["vad"])
+
+
 @server.rtc_session(agent_name=AGENT_NAME)
 async def entrypoint(ctx: JobContext):
     
@@ -48,19 +104,21 @@ async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
 
     db: SupabaseDB = ctx.proc.userdata["db"]
-    session_id = await asyncio.to_thread(db.create_call_session, ctx.room.name)
+    session_id = await db.create_call_session(ctx.room.name)
+
+    llm = ctx.proc.userdata["llm"]
 
     session = AgentSession(
         stt=deepgram.STTv2(
             model=SETTINGS.deepgram_model,
             eager_eot_threshold=SETTINGS.eager_eot_threshold,
         ),
-        llm=openai.LLM(model=SETTINGS.openai_model),
+        llm=llm,
         tts=cartesia.TTS(
             model=SETTINGS.cartesia_model,
             voice=SETTINGS.cartesia_voice_id,
         ),
-        vad=ctx.proc.userdata["vad"],
+        vad=await get_vad(ctx.proc),
         turn_detection=MultilingualModel(),
         preemptive_generation=SETTINGS.preemptive_generation,
         resume_false_interruption=SETTINGS.resume_false_interruption,
@@ -78,36 +136,91 @@ async def entrypoint(ctx: JobContext):
 
         try:
             raw_metrics = getattr(ev, "metrics", ev)
-            if raw_metrics:
+            # Introspection is for debugging only; skip all of it at INFO
+            if raw_metrics and logger.isEnabledFor(logging.DEBUG):
                 class_name = raw_metrics.__class__.__name__
-                logger.info(f"[METRICS] Received metrics: {class_name}")
-                # Log ALL non-private attributes for debugging
-                all_attrs = [x for x in dir(raw_metrics) if not x.startswith('_')]
-                logger.info(f"[METRICS] {class_name} available attributes: {all_attrs}")
-                # Log key attributes with their values
-                attrs_to_check = ["duration", "duration_ms", "audio_duration", "audio_duration_ms", 
-                                 "input_tokens", "output_tokens", "characters_count", "character_count",
-                                 "usage", "type"]
-                for attr in attrs_to_check:
-                    if hasattr(raw_metrics, attr):
-                        try:
-                            val = getattr(raw_metrics, attr)
-                            logger.info(f"[METRICS] {class_name}.{attr} = {val} (type: {type(val).__name__})")
-                        except Exception as e:
-                            logger.debug(f"[METRICS] Could not read {class_name}.{attr}: {e}")
+                logger.debug("[METRICS] Received metrics: %s", class_name)
+                for attr in METRICS_DEBUG_ATTRS:
+                    val = getattr(raw_metrics, attr, None)
+                    if val is not None:
+                        logger.debug("[METRICS] %s.%s = %r (type: %s)", class_name, attr, val, type(val).__name__)
             analytics.ingest_metrics(raw_metrics)
         except Exception:
             logger.exception("Failed to ingest metrics")
 
-    async def _store_message(role: str, text: str, meta: dict):
+    # call_messages are queued and written in batches by a single background flusher
+    msg_queue: asyncio.Queue = asyncio.Queue()
+
+    msg_seq = 0
+
+    def _store_message(role: str, text: str, meta: dict) -> None:
+        nonlocal msg_seq
         t = (text or "").strip()
         if not t:
             return
+        if role not in MSG_ROLES:
+            logger.debug("Skipping call_message with role %r", role)
+            return
+        # Rows of one batch would all get the same now() default; stamp order at queue time
+        msg_seq += 1
+        msg_queue.put_nowait(
+            {
+                "session_id": session_id,
+                "role": role,
+                "content": t,
+                "meta": {**(meta or {}), "seq": msg_seq},
+                "created_at": utc_now_iso(),
+            }
+        )
+
+    async def _flush_messages(rows: list) -> None:
         try:
-            await asyncio.to_thread(db.insert_call_message, session_id, role, t, meta)
+            await db.insert_call_messages_bulk(rows)
+            return
         except Exception:
-            logger.exception("Failed to insert call_message")
-        
+            if len(rows) == 1:
+                logger.exception("Failed to insert call_message")
+                return
+            logger.exception("Failed to insert call_messages batch; retrying rows one by one")
+        # Keep the good rows when one row is rejected
+        for row in rows:
+            try:
+                await db.insert_call_messages_bulk([row])
+            except Exception:
+                logger.exception("Failed to insert call_message")
+
+    async def _message_flusher() -> None:
+        """Flush queued messages on batch size or interval; a None item flushes and stops."""
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await msg_queue.get()
+            if row is None:
+                return
+            buf = [row]
+            stop = False
+            deadline = loop.time() + MSG_FLUSH_INTERVAL_S
+            while len(buf) < MSG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(msg_queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                buf.append(row)
+            await _flush_messages(buf)
+            if stop:
+                return
+
+    msg_flusher = asyncio.create_task(_message_flusher())
+
+    async def _drain_messages():
+        msg_queue.put_nowait(None)
+        await msg_flusher
+
     def _fire_and_log(task: asyncio.Task):
         def _done(t: asyncio.Task):
             try:
@@ -154,6 +267,9 @@ async def entrypoint(ctx: JobContext):
         except Exception:
             logger.exception("user_input_transcribed handler failed")
 
+    # Ids of recently queued items; a re-delivered event is not written again
+    recent_item_ids: deque = deque(maxlen=8)
+
     @session.on("conversation_item_added")
     def _on_conversation_item_added(ev: ConversationItemAddedEvent):
         try:
@@ -161,6 +277,12 @@ async def entrypoint(ctx: JobContext):
             if not item:
                 return
 
+            item_id = getattr(item, "id", None)
+            if item_id is not None:
+                if item_id in recent_item_ids:
+                    return
+                recent_item_ids.append(item_id)
+
             role = getattr(item, "role", None) or "unknown"
 
             # Defensive across LiveKit versions
@@ -184,10 +306,7 @@ async def entrypoint(ctx: JobContext):
             if not text:
                 return
 
-            task = asyncio.create_task(
-                _store_message(role, text, {"event": "conversation_item_added"})
-            )
-            _fire_and_log(task)
+            _store_message(role, text, {"event": "conversation_item_added"})
 
         except Exception:
             logger.exception("conversation_item_added handler failed")
@@ -200,23 +319,33 @@ async def entrypoint(ctx: JobContext):
         except Exception:
             logger.exception("Failed to ingest usage summary into analytics")
 
-    ctx.add_shutdown_callback(_log_usage)
-
-    avatar = bey.AvatarSession(
-        api_key=SETTINGS.bey_api_key,
-        avatar_id=SETTINGS.bey_avatar_id,
-        avatar_participant_identity="Eternal (SuperBryn)",
-        avatar_participant_name="Eternal (SuperBryn)",
-    )
-    await avatar.start(session, room=ctx.room)
-
     agent = EternalAgent(
         db=db, 
         session_id=session_id, 
-        summary_llm=openai.LLM(model=SETTINGS.openai_model), 
+        summary_llm=ctx.proc.userdata["summary_llm"],
         summary_model=SETTINGS.openai_model,
-        analytics=analytics
+        analytics=analytics,
+        summary_min_turns=SETTINGS.summary_min_turns,
         )
+
+    async def _on_shutdown():
+        # LiveKit runs shutdown callbacks one after another; overlap ours
+        # (tool-event writes still pending when the caller hangs up are flushed here)
+        results = await asyncio.gather(
+            _drain_messages(),
+            _log_usage(),
+            agent.drain_pending_writes(),
+            return_exceptions=True,
+        )
+        for r in results:
+            if isinstance(r, Exception):
+                logger.error("Shutdown step failed", exc_info=r)
+
+    ctx.add_shutdown_callback(_on_shutdown)
+
+    avatar = ctx.proc.userdata["avatar_factory"]()
+    await avatar.start(session, room=ctx.room)
+
     await session.start(room=ctx.room, agent=agent)
 
 
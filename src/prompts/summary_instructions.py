@@ -22,3 +22,9 @@ SUMMARY_INSTRUCTIONS_TEMPLATE = (
     "- preferences: infer from the conversation (preferred dates/times/time windows), else keep arrays empty.\n"
     "- timezone must be Asia/Kolkata.\n\n"
 )
+
+# Split once on the placeholder; the template holds literal JSON braces, so no str.format
+_SUMMARY_INSTRUCTIONS_PARTS = SUMMARY_INSTRUCTIONS_TEMPLATE.split("{caller_ref}")
+
+def render_summary_instructions(caller_ref: str) -> str:
+    return caller_ref.join(_SUMMARY_INSTRUCTIONS_PARTS)
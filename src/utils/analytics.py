@@ -6,16 +6,27 @@ github: https://github.com/yagnikposhiya/eternal-agent
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from datetime import datetime, timezone
 
-def _get(obj: Any, key: str, default: Any = 0) -> Any:
-    """Safe getter for dicts or objects."""
-    if obj is None:
-        return default
+try:
+    from livekit.agents.metrics import LLMMetrics, STTMetrics, TTSMetrics
+except ImportError:
+    LLMMetrics = STTMetrics = TTSMetrics = None
+
+# Unit conversions for pricing (multiply instead of divide)
+_PER_MILLION = 1e-6
+_PER_MINUTE_MS = 1.0 / 60000.0
+_PER_100K = 1e-5
+
+def _none_getter(key: str) -> Any:
+    return None
+
+def _getter(obj: Any) -> Callable[[str], Any]:
+    """key -> value (None if missing) for a dict or an object, resolved once per obj."""
     if isinstance(obj, dict):
-        return obj.get(key, default)
-    return getattr(obj, key, default)
+        return obj.get
+    return lambda key: getattr(obj, key, None)
 
 def _norm_metric_type(v: Any) -> str:
     """
@@ -36,15 +47,17 @@ def _norm_metric_type(v: Any) -> str:
         s = s.split(".")[-1]
     return s
 
-def _first_int(*vals: Any, default: int = 0) -> int:
-    for v in vals:
+def _first_int4(a: Any, b: Any = None, c: Any = None, d: Any = None, default: int = 0) -> int:
+    """First of a..d that converts to int; SDK ints skip the try/except."""
+    for v in (a, b, c, d):
         if v is None:
             continue
+        if isinstance(v, int):
+            return v
         try:
-            iv = int(v)
+            return int(v)
         except Exception:
             continue
-        return iv
     return default
 
 @dataclass
@@ -99,79 +112,82 @@ class SessionAnalytics:
         for m in metrics_list:
             if m is None:
                 continue
-            
-            # Detect metric type from class name (e.g., STTMetrics -> "stt", LLMMetrics -> "llm")
-            class_name = m.__class__.__name__.lower()
-            mtype = ""
-            if "stt" in class_name:
-                mtype = "stt"
-            elif "llm" in class_name:
-                mtype = "llm"
-            elif "tts" in class_name:
-                mtype = "tts"
-            else:
-                # Fallback: try to get type attribute
-                mtype = _norm_metric_type(_get(m, "type", None))
-            
-            # Get duration - try multiple field names and handle seconds->ms conversion
-            dur_ms = 0
-            dur_sec = _get(m, "duration", None)
-            dur_ms_attr = _get(m, "duration_ms", None)
-            
-            if dur_ms_attr is not None:
-                try:
-                    dur_ms = int(float(dur_ms_attr))
-                except (ValueError, TypeError):
-                    pass
-            elif dur_sec is not None:
+            # Known LiveKit classes read their fields directly; anything else goes through the fallback
+            _INGESTORS.get(type(m), SessionAnalytics._ingest_fallback)(self, m)
+
+    def _ingest_llm(self, m: Any) -> None:
+        self.usage.llm_input_tokens += m.prompt_tokens
+        self.usage.llm_output_tokens += m.completion_tokens
+
+    def _ingest_stt(self, m: Any) -> None:
+        # audio_duration is the length of audio processed (for usage/cost), in seconds
+        self.usage.stt_audio_ms += int(m.audio_duration * 1000)
+
+    def _ingest_tts(self, m: Any) -> None:
+        self.usage.tts_chars += m.characters_count
+
+    def _ingest_fallback(self, m: Any) -> None:
+        """Dicts and unknown metric classes: detect the type by name and probe field names."""
+        # Branch on dict vs object once, not per field
+        get = _getter(m)
+
+        # Detect metric type from class name (e.g., STTMetrics -> "stt", LLMMetrics -> "llm")
+        class_name = m.__class__.__name__.lower()
+        mtype = ""
+        if "stt" in class_name:
+            mtype = "stt"
+        elif "llm" in class_name:
+            mtype = "llm"
+        elif "tts" in class_name:
+            mtype = "tts"
+        else:
+            # Fallback: try to get type attribute
+            mtype = _norm_metric_type(get("type"))
+
+        if mtype == "llm":
+            usage = get("usage")
+            uget = _getter(usage) if usage else _none_getter
+            # Try multiple ways to get tokens
+            self.usage.llm_input_tokens += _first_int4(
+                uget("input_tokens"),
+                uget("prompt_tokens"),
+                get("input_tokens"),
+                get("prompt_tokens"),
+                default=0,
+            )
+            self.usage.llm_output_tokens += _first_int4(
+                uget("output_tokens"),
+                uget("completion_tokens"),
+                get("output_tokens"),
+                get("completion_tokens"),
+                default=0,
+            )
+
+        elif mtype == "stt":
+            # audio_duration is the length of audio processed (for usage/cost), in seconds
+            audio_dur_sec = get("audio_duration")
+            audio_dur_ms = 0
+            if audio_dur_sec is not None:
                 try:
-                    dur_ms = int(float(dur_sec) * 1000)  # Convert seconds to ms
+                    audio_dur_ms = int(float(audio_dur_sec) * 1000)  # Convert seconds to ms
                 except (ValueError, TypeError):
                     pass
-
-            if mtype == "llm":
-                usage = _get(m, "usage", None)
-                # Try multiple ways to get tokens
-                self.usage.llm_input_tokens += _first_int(
-                    _get(usage, "input_tokens", None) if usage else None,
-                    _get(usage, "prompt_tokens", None) if usage else None,
-                    _get(m, "input_tokens", None),
-                    _get(m, "prompt_tokens", None),
-                    default=0,
-                )
-                self.usage.llm_output_tokens += _first_int(
-                    _get(usage, "output_tokens", None) if usage else None,
-                    _get(usage, "completion_tokens", None) if usage else None,
-                    _get(m, "output_tokens", None),
-                    _get(m, "completion_tokens", None),
+            else:
+                # Fallback to ms attributes
+                audio_dur_ms = _first_int4(
+                    get("audio_duration_ms"),
+                    get("audio_ms"),
                     default=0,
                 )
+            self.usage.stt_audio_ms += audio_dur_ms
 
-            elif mtype == "stt":
-                # audio_duration is the length of audio processed (for usage/cost), in seconds
-                audio_dur_sec = _get(m, "audio_duration", None)
-                audio_dur_ms = 0
-                if audio_dur_sec is not None:
-                    try:
-                        audio_dur_ms = int(float(audio_dur_sec) * 1000)  # Convert seconds to ms
-                    except (ValueError, TypeError):
-                        pass
-                else:
-                    # Fallback to ms attributes
-                    audio_dur_ms = _first_int(
-                        _get(m, "audio_duration_ms", None),
-                        _get(m, "audio_ms", None),
-                        default=0,
-                    )
-                self.usage.stt_audio_ms += audio_dur_ms
-
-            elif mtype == "tts":
-                self.usage.tts_chars += _first_int(
-                    _get(m, "characters_count", None),
-                    _get(m, "character_count", None),
-                    _get(m, "chars", None),
-                    default=0,
-                )
+        elif mtype == "tts":
+            self.usage.tts_chars += _first_int4(
+                get("characters_count"),
+                get("character_count"),
+                get("chars"),
+                default=0,
+            )
 
     def ingest_usage_summary(self, summary: Dict[str, Any]) -> None:
         """
@@ -195,12 +211,12 @@ class SessionAnalytics:
         llm_data = summary.get("llm", {})
         if llm_data:
             logger.debug(f"[USAGE_SUMMARY] LLM data: {llm_data}")
-            self.usage.llm_input_tokens += _first_int(
+            self.usage.llm_input_tokens += _first_int4(
                 llm_data.get("input_tokens"),
                 llm_data.get("prompt_tokens"),
                 default=0,
             )
-            self.usage.llm_output_tokens += _first_int(
+            self.usage.llm_output_tokens += _first_int4(
                 llm_data.get("output_tokens"),
                 llm_data.get("completion_tokens"),
                 default=0,
@@ -209,7 +225,7 @@ class SessionAnalytics:
         stt_data = summary.get("stt", {})
         if stt_data:
             logger.debug(f"[USAGE_SUMMARY] STT data: {stt_data}")
-            self.usage.stt_audio_ms += _first_int(
+            self.usage.stt_audio_ms += _first_int4(
                 stt_data.get("audio_duration_ms"),
                 stt_data.get("audio_ms"),
                 # audio_duration might be in seconds
@@ -220,7 +236,7 @@ class SessionAnalytics:
         tts_data = summary.get("tts", {})
         if tts_data:
             logger.debug(f"[USAGE_SUMMARY] TTS data: {tts_data}")
-            self.usage.tts_chars += _first_int(
+            self.usage.tts_chars += _first_int4(
                 tts_data.get("characters_count"),
                 tts_data.get("character_count"),
                 tts_data.get("chars"),
@@ -238,12 +254,15 @@ class SessionAnalytics:
         p = self.pricing
         u = self.usage
 
-        openai = (u.llm_input_tokens / 1_000_000.0) * p.openai_in_per_million + \
-                 (u.llm_output_tokens / 1_000_000.0) * p.openai_out_per_million
+        openai = u.llm_input_tokens * _PER_MILLION * p.openai_in_per_million + \
+                 u.llm_output_tokens * _PER_MILLION * p.openai_out_per_million
 
-        deepgram = (u.stt_audio_ms / 60000.0) * p.deepgram_per_min
-        cartesia = (u.tts_chars / 100_000.0) * p.cartesia_per_100k_chars
-        bey = (u.session_ms / 60000.0) * p.bey_per_min
+        stt_minutes = u.stt_audio_ms * _PER_MINUTE_MS
+        session_minutes = u.session_ms * _PER_MINUTE_MS
+
+        deepgram = stt_minutes * p.deepgram_per_min
+        cartesia = u.tts_chars * _PER_100K * p.cartesia_per_100k_chars
+        bey = session_minutes * p.bey_per_min
 
         total = openai + deepgram + cartesia + bey
 
@@ -258,9 +277,9 @@ class SessionAnalytics:
             "usage": {
                 "llm_input_tokens": u.llm_input_tokens,
                 "llm_output_tokens": u.llm_output_tokens,
-                "stt_audio_minutes": round(u.stt_audio_ms / 60000.0, 4),
+                "stt_audio_minutes": round(stt_minutes, 4),
                 "tts_characters": u.tts_chars,
-                "session_minutes": round(u.session_ms / 60000.0, 4),
+                "session_minutes": round(session_minutes, 4),
             },
         }
 
@@ -269,3 +288,13 @@ class SessionAnalytics:
         return {
             "cost": self.compute_cost_usd(),
         }
+
+
+# Metric class -> SessionAnalytics ingestor (O(1) dispatch on the common path)
+_INGESTORS: Dict[type, Callable[[SessionAnalytics, Any], None]] = {}
+if LLMMetrics is not None:
+    _INGESTORS[LLMMetrics] = SessionAnalytics._ingest_llm
+if STTMetrics is not None:
+    _INGESTORS[STTMetrics] = SessionAnalytics._ingest_stt
+if TTSMetrics is not None:
+    _INGESTORS[TTSMetrics] = SessionAnalytics._ingest_tts
@@ -6,73 +6,145 @@ github: https://github.com/yagnikposhiya/eternal-agent
 from __future__ import annotations
 
 import re
+import time
 
-from typing import Union
-from livekit.agents import JobProcess
-from livekit.plugins import silero
+from functools import lru_cache
+from typing import Dict, Iterable, List, NewType, Optional, Tuple, Union
 from datetime import date, datetime, timedelta, timezone
-from zoneinfo import ZoneInfo
 
+# Asia/Kolkata has had a fixed +05:30 offset with no DST since 1945
 IST = timezone(timedelta(hours=5, minutes=30))
-IST_TZ = ZoneInfo("Asia/Kolkata")
+_UTC = timezone.utc
 IST_TZ_NAME = "Asia/Kolkata"
 
-def prewarm(proc: JobProcess) -> None:
-    """
-    Preload heavy resources once per worker process.
-    """
-    proc.userdata["vad"] = silero.VAD.load()
+# Output of normalize_phone; DB methods take this and do not re-normalize
+NormalizedPhone = NewType("NormalizedPhone", str)
+
+_NON_DIGIT_RE = re.compile(r"\D")
+# Every byte except b"0".."9", for bytes.translate(None, delete)
+_NON_DIGIT_BYTES = bytes(c for c in range(256) if not (0x30 <= c <= 0x39))
 
-def normalize_phone(raw: str) -> str:
+@lru_cache(maxsize=2048)
+def normalize_phone(raw: str) -> NormalizedPhone:
     """
     Normalize phone number to 10-digit Indian format when possible.
     - Removes spaces, +, -, etc.
     - Converts 91XXXXXXXXXX -> XXXXXXXXXX
+    Memoized per worker process (numbers are not kept beyond process lifetime).
     """
-    d = re.sub(r"\D", "", raw or "")
+    if not raw:
+        return NormalizedPhone("")
+    s = raw
+    if s.isascii():
+        if s.isdigit():
+            # Already clean (the usual case once identify_user has run)
+            d = s
+        else:
+            # Single C pass over bytes; \D below also keeps non-ASCII digits
+            d = s.encode("ascii").translate(None, _NON_DIGIT_BYTES).decode("ascii")
+    else:
+        d = _NON_DIGIT_RE.sub("", s)
     if len(d) == 12 and d.startswith("91"):
         d = d[2:]
-    return d
+    return NormalizedPhone(d)
 
 def parse_iso(value: Union[str, datetime]) -> datetime:
     """Parse ISO string safely. Supports trailing Z, and assumes UTC if tz missing."""
     if isinstance(value, datetime):
         dt = value
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        return dt
-
-    v = (value or "").replace("Z", "+00:00")
-    dt = datetime.fromisoformat(v)
+    else:
+        dt = _parse_iso_str(value or "")
     if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
+        dt = dt.replace(tzinfo=_UTC)
     return dt
 
+@lru_cache(maxsize=4096)
+def _parse_iso_str(v: str) -> datetime:
+    # Slot/appointment timestamps repeat across tool calls; datetimes are immutable
+    try:
+        # Python 3.11+ parses a trailing Z natively; no intermediate string
+        return datetime.fromisoformat(v)
+    except ValueError:
+        if not v.endswith("Z"):
+            raise
+        return datetime.fromisoformat(v[:-1] + "+00:00")
+
+@lru_cache(maxsize=4096)
 def iso_to_ist_iso(value: str) -> str:
     """Convert an ISO datetime string to IST ISO string (+05:30)."""
     return parse_iso(value).astimezone(IST).isoformat()
 
+def iso_to_ist_iso_many(values: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """
+    Convert many ISO datetime strings to IST ISO strings in one pass.
+    Empty/None values map to None.
+    """
+    conv = iso_to_ist_iso
+    return [conv(v) if v else None for v in values]
+
+_IST_OFFSET_US = 19800 * 1_000_000
+
+# UTC offset (us) -> (shifted epoch second, "YYYY-MM-DDTHH:MM:SS") last formatted
+_NOW_PREFIX_CACHE: Dict[int, Tuple[int, str]] = {}
+
+def _now_iso(offset_us: int, suffix: str) -> str:
+    # Shift epoch microseconds by the offset; re-format the date/time part only when the second changes
+    sec, us = divmod(time.time_ns() // 1000 + offset_us, 1_000_000)
+    cached = _NOW_PREFIX_CACHE.get(offset_us)
+    if cached is None or cached[0] != sec:
+        t = time.gmtime(sec)
+        cached = (sec, f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}")
+        _NOW_PREFIX_CACHE[offset_us] = cached
+    return f"{cached[1]}.{us:06d}{suffix}"
+
+def utc_now_iso() -> str:
+    """Current time in UTC as ISO string."""
+    return _now_iso(0, "+00:00")
+
 def now_ist_iso() -> str:
     """Current time in IST as ISO string."""
-    return datetime.now(IST).isoformat()
+    return _now_iso(_IST_OFFSET_US, "+05:30")
 
 def get_today_ist_date() -> date:
     """
     Returns today's date in IST as a datetime.date object.
     Example print format: 2026-01-23
     """
-    return datetime.now(IST_TZ).date()
+    return datetime.now(IST).date()
+
 
+# English names, independent of the process locale (unlike strftime %b/%A)
+_MONTH_ABBR = ("", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# Formatted date strings only change at IST midnight; keyed on the IST date
+_TODAY_STR_CACHE: Optional[Tuple[date, str]] = None
+_WINDOW_END_STR_CACHE: Dict[Tuple[date, int, bool], str] = {}
 
 def get_today_ist_str() -> str:
     """
     Returns today's date string in the format used by your system instructions.
     Format: '23 Jan 2026 (Friday)'
     """
-    now_ist = datetime.now(IST_TZ)
-    return now_ist.strftime("%d %b %Y (%A)")
+    global _TODAY_STR_CACHE
+    today = get_today_ist_date()
+    cached = _TODAY_STR_CACHE
+    if cached is not None and cached[0] == today:
+        return cached[1]
+    out = f"{today.day:02d} {_MONTH_ABBR[today.month]} {today.year} ({_WEEKDAY_NAMES[today.weekday()]})"
+    _TODAY_STR_CACHE = (today, out)
+    return out
 
 
+# Default 14-day booking window offsets, built once
+_WINDOW_DELTA_INCL_14 = timedelta(days=13)
+_WINDOW_DELTA_EXCL_14 = timedelta(days=14)
+
+def _window_delta(window_days: int, inclusive: bool) -> timedelta:
+    if window_days == 14:
+        return _WINDOW_DELTA_INCL_14 if inclusive else _WINDOW_DELTA_EXCL_14
+    return timedelta(days=(window_days - 1) if inclusive else window_days)
+
 def get_booking_window_end_ist_date(window_days: int = 14, inclusive: bool = True) -> date:
     """
     Returns the booking window end date in IST as a datetime.date object.
@@ -83,9 +155,7 @@ def get_booking_window_end_ist_date(window_days: int = 14, inclusive: bool = Tru
     - inclusive=False: end date = today + window_days
       Example: today + 15 (often used when end is exclusive)
     """
-    today = get_today_ist_date()
-    delta_days = (window_days - 1) if inclusive else window_days
-    return today + timedelta(days=delta_days)
+    return get_today_ist_date() + _window_delta(window_days, inclusive)
 
 
 def get_booking_window_end_ist_str(window_days: int = 14, inclusive: bool = True) -> str:
@@ -93,5 +163,14 @@ def get_booking_window_end_ist_str(window_days: int = 14, inclusive: bool = True
     Returns the booking window end date string.
     Format: '22 Feb 2026'
     """
-    end_date = get_booking_window_end_ist_date(window_days=window_days, inclusive=inclusive)
-    return end_date.strftime("%d %b %Y")
\ No newline at end of file
+    today = get_today_ist_date()
+    key = (today, window_days, inclusive)
+    out = _WINDOW_END_STR_CACHE.get(key)
+    if out is None:
+        if len(_WINDOW_END_STR_CACHE) >= 32:
+            # Mostly entries from previous days
+            _WINDOW_END_STR_CACHE.clear()
+        end = today + _window_delta(window_days, inclusive)
+        out = f"{end.day:02d} {_MONTH_ABBR[end.month]} {end.year}"
+        _WINDOW_END_STR_CACHE[key] = out
+    return out
\ No newline at end of file
@@ -0,0 +1,26 @@
+CREATE OR REPLACE FUNCTION "public"."list_slots_with_availability"("p_start" timestamp with time zone, "p_end" timestamp with time zone, "p_limit" integer DEFAULT 200) RETURNS TABLE("id" "uuid", "start_at" timestamp with time zone, "end_at" timestamp with time zone, "is_booked" boolean)
+    LANGUAGE "sql" STABLE
+    AS $$
+  select
+    s.id,
+    s.start_at,
+    s.end_at,
+    (a.id is not null) as is_booked
+  from public.slots s
+  left join public.appointments a
+    on a.slot_id = s.id
+   and a.status = 'booked'::public.appointment_status
+  where s.is_enabled = true
+    and s.start_at >= p_start
+    and s.start_at < p_end
+  order by s.start_at
+  limit p_limit;
+$$;
+
+
+ALTER FUNCTION "public"."list_slots_with_availability"("p_start" timestamp with time zone, "p_end" timestamp with time zone, "p_limit" integer) OWNER TO "postgres";
+
+
+GRANT ALL ON FUNCTION "public"."list_slots_with_availability"("p_start" timestamp with time zone, "p_end" timestamp with time zone, "p_limit" integer) TO "anon";
+GRANT ALL ON FUNCTION "public"."list_slots_with_availability"("p_start" timestamp with time zone, "p_end" timestamp with time zone, "p_limit" integer) TO "authenticated";
+GRANT ALL ON FUNCTION "public"."list_slots_with_availability"("p_start" timestamp with time zone, "p_end" timestamp with time zone, "p_limit" integer) TO "service_role";